@@ -5,6 +5,7 @@ Handles initial setup and data processing
 """
 
 import os
+import shutil
 import sys
 import subprocess
 import logging
@@ -17,8 +18,16 @@ logger = logging.getLogger(__name__)
 def install_requirements():
     """Install required Python packages"""
     logger.info("Installing requirements...")
+    
+    # Prefer uv's much faster resolver when it is installed
+    if shutil.which("uv"):
+        command = ["uv", "pip", "install", "--python", sys.executable, "-r", "../requirements.txt"]
+    else:
+        command = [sys.executable, "-m", "pip", "install", "--prefer-binary",
+                   "--disable-pip-version-check", "-r", "../requirements.txt"]
+    
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "../requirements.txt"])
+        subprocess.check_call(command)
         logger.info("Requirements installed successfully")
         return True
     except subprocess.CalledProcessError as e:
@@ -27,38 +36,36 @@ def install_requirements():
 
 
 def setup_directories():
-    """Ensure all necessary directories exist"""
+    """Ensure all necessary directories exist, with .gitkeep files for the data directories"""
     logger.info("Setting up directories...")
     
-    directories = [
-        "../data/raw/london",
-        "../data/raw/nyc", 
-        "../data/processed/london",
-        "../data/processed/nyc",
-        "../src/web/assets/css",
-        "../src/web/assets/js"
-    ]
+    # Directory -> whether it needs a .gitkeep to preserve it in git
+    directories = {
+        "../data/raw/london": True,
+        "../data/raw/nyc": True,
+        "../data/processed/london": True,
+        "../data/processed/nyc": True,
+        "../src/web/assets/css": False,
+        "../src/web/assets/js": False
+    }
     
-    for directory in directories:
+    for directory, needs_gitkeep in directories.items():
         os.makedirs(directory, exist_ok=True)
         logger.info(f"Created directory: {directory}")
-
-
-def create_gitkeep_files():
-    """Create .gitkeep files to preserve directory structure"""
-    logger.info("Creating .gitkeep files...")
-    
-    directories = [
-        "../data/raw/london",
-        "../data/raw/nyc",
-        "../data/processed/london", 
-        "../data/processed/nyc"
-    ]
-    
-    for directory in directories:
+        
+        if not needs_gitkeep:
+            continue
+        
+        # O_EXCL checks and creates in one syscall, leaving existing files alone
         gitkeep_path = os.path.join(directory, ".gitkeep")
-        with open(gitkeep_path, 'w') as f:
-            f.write("# This file ensures the directory is tracked by git\n")
+        try:
+            fd = os.open(gitkeep_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            continue
+        try:
+            os.write(fd, b"# This file ensures the directory is tracked by git\n")
+        finally:
+            os.close(fd)
 
 
 def run_data_processing():
@@ -108,7 +115,6 @@ def main():
     
     # Step 1: Setup directories
     setup_directories()
-    create_gitkeep_files()
     
     # Step 2: Install requirements
     if not install_requirements():
@@ -4,17 +4,37 @@ Crime Data Processor for SafeWorld
 Handles processing of crime data from various sources and generates safety scores
 """
 
+import numpy as np
 import pandas as pd
 import requests
-import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
 from typing import Dict, List, Optional, Tuple
 import logging
 
+# Works both as part of the data_processing package and when run as a script
+try:
+    from .http_utils import SESSION
+    from .io_utils import (JSON_WRITE_BUFFER, PYARROW_CSV_AVAILABLE, json_dumps, json_loads,
+                           iter_processed_data, processed_data_file, write_processed_data)
+except ImportError:
+    from http_utils import SESSION
+    from io_utils import (JSON_WRITE_BUFFER, PYARROW_CSV_AVAILABLE, json_dumps, json_loads,
+                          iter_processed_data, processed_data_file, write_processed_data)
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows per chunk when streaming CSV files
+CSV_CHUNK_SIZE = 200_000
+
+# NYC Open Data paging: records per request and concurrent requests
+NYC_PAGE_SIZE = 10_000
+NYC_MAX_WORKERS = 8
+
 
 class CrimeDataProcessor:
     """Main class for processing crime data and generating safety scores"""
@@ -36,12 +56,18 @@ class CrimeDataProcessor:
         os.makedirs(os.path.join(self.processed_dir, "london"), exist_ok=True)
         os.makedirs(os.path.join(self.processed_dir, "nyc"), exist_ok=True)
 
-    def fetch_nyc_crime_data(self) -> Optional[Dict]:
+    def fetch_nyc_crime_data(self, max_records: int = NYC_PAGE_SIZE) -> Optional[List[Dict]]:
         """
         Fetch NYC crime data from NYC Open Data API
         
+        Records are requested in pages of NYC_PAGE_SIZE which are fetched
+        concurrently and merged back in offset order.
+        
+        Args:
+            max_records: Maximum number of crime records to fetch
+            
         Returns:
-            Dictionary containing crime data or None if failed
+            List of crime records or None if failed
         """
         logger.info("Fetching NYC crime data...")
         
@@ -49,27 +75,45 @@ class CrimeDataProcessor:
         url = "https://data.cityofnewyork.us/resource/5uac-w243.json"
         
         # Parameters to limit data and get recent crimes
+        # A stable $order keeps $offset pages from overlapping
         params = {
-            "$limit": 10000,
             "$where": "cmplnt_fr_dt > '2023-01-01'",
-            "$select": "boro_nm,ofns_desc,law_cat_cd,latitude,longitude,cmplnt_fr_dt"
+            "$select": "boro_nm,ofns_desc,law_cat_cd,latitude,longitude,cmplnt_fr_dt",
+            "$order": ":id"
         }
+        offsets = range(0, max_records, NYC_PAGE_SIZE)
+        if not offsets:
+            logger.warning(f"Not fetching NYC crime data: max_records is {max_records}")
+            return []
         
-        try:
-            response = requests.get(url, params=params, timeout=30)
+        def fetch_page(offset: int) -> List[Dict]:
+            limit = min(NYC_PAGE_SIZE, max_records - offset)
+            start = time.perf_counter()
+            response = SESSION.get(url, params={**params, "$limit": limit, "$offset": offset}, timeout=30)
             response.raise_for_status()
+            page = json_loads(response.content)
+            logger.info(f"Fetched {len(page)} NYC crime records at offset {offset} "
+                        f"in {time.perf_counter() - start:.2f}s")
+            return page
+        
+        try:
+            pages = {}
+            with ThreadPoolExecutor(max_workers=min(NYC_MAX_WORKERS, len(offsets))) as executor:
+                futures = {executor.submit(fetch_page, offset): offset for offset in offsets}
+                for future in as_completed(futures):
+                    pages[futures[future]] = future.result()
             
-            data = response.json()
+            data = [record for offset in offsets for record in pages[offset]]
             logger.info(f"Successfully fetched {len(data)} NYC crime records")
             
             # Save raw data
             raw_file = os.path.join(self.raw_dir, "nyc", "nyc_crime_raw.json")
-            with open(raw_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(raw_file, 'wb', buffering=JSON_WRITE_BUFFER) as f:
+                f.write(json_dumps(data))
             
             return data
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error(f"Error fetching NYC crime data: {e}")
             return None
 
@@ -86,31 +130,54 @@ class CrimeDataProcessor:
         logger.info(f"Processing London crime data from {csv_file}")
         
         try:
-            # Read the crime data
-            df = pd.read_csv(csv_file)
-            
             # Ensure required columns exist
             required_cols = ['Borough', 'Crimes12M']
-            if not all(col in df.columns for col in required_cols):
+            header = pd.read_csv(csv_file, nrows=0).columns
+            if not all(col in header for col in required_cols):
                 raise ValueError(f"CSV must contain columns: {required_cols}")
             
-            # Clean borough names
-            df['Borough'] = df['Borough'].str.strip().str.title()
+            # Read the crime data, parsing with pyarrow in one go when it is
+            # usable (its engine cannot chunk) and otherwise streaming it
+            # in chunks with the C engine
+            borough_totals = defaultdict(int)
+            if PYARROW_CSV_AVAILABLE:
+                reader = [pd.read_csv(csv_file,
+                                      engine='pyarrow',
+                                      dtype_backend='pyarrow',
+                                      usecols=required_cols,
+                                      dtype={'Crimes12M': 'int64'})]
+            else:
+                reader = pd.read_csv(csv_file,
+                                     usecols=required_cols,
+                                     dtype={'Crimes12M': 'int64'},
+                                     chunksize=CSV_CHUNK_SIZE)
+            
+            # Total crimes per borough in one pass
+            for chunk in reader:
+                # Clean borough names
+                chunk['Borough'] = chunk['Borough'].str.strip().str.title()
+                for borough, crimes in chunk.groupby('Borough', sort=False)['Crimes12M'].sum().items():
+                    borough_totals[borough] += int(crimes)
+            
+            df = pd.DataFrame({
+                'Borough': list(borough_totals.keys()),
+                'Crimes12M': list(borough_totals.values())
+            })
             
             # Calculate safety score (1-10, where 1 is safest)
             # Using quantile-based scoring
-            df['Score'] = pd.qcut(df['Crimes12M'], 
-                                q=10, 
-                                labels=range(1, 11),
-                                duplicates='drop').astype(int)
+            df['Score'] = self._quantile_scores(df['Crimes12M'], 10)
+            
+            # Crime counts comfortably fit in 32 bits (Score is already int8)
+            df['Crimes12M'] = df['Crimes12M'].astype(np.int32)
             
             # Add crime rate per 1000 residents (if population data available)
             # This is a simplified calculation - in reality you'd use actual population data
             df['CrimeRate'] = df['Crimes12M'] / 1000  # Placeholder
             
             # Save processed data
-            processed_file = os.path.join(self.processed_dir, "london", "london_crime_processed.csv")
-            df.to_csv(processed_file, index=False)
+            processed_file = processed_data_file(self.processed_dir, "london")
+            write_processed_data(df, processed_file)
             
             logger.info(f"Processed {len(df)} London boroughs")
             return df
@@ -137,23 +204,25 @@ class CrimeDataProcessor:
             
             # Clean and filter data
             df = df.dropna(subset=['boro_nm'])
-            df['boro_nm'] = df['boro_nm'].str.strip().str.title()
+            df['boro_nm'] = df['boro_nm'].str.strip().str.title().astype('category')
             
-            # Count crimes by borough
-            borough_counts = df.groupby('boro_nm').size().reset_index(name='Crimes12M')
+            # Count crimes by borough, counting the categorical codes directly
+            # (code -1 marks names that became missing while cleaning)
+            codes = df['boro_nm'].cat.codes.to_numpy()
+            codes, counts = np.unique(codes[codes >= 0], return_counts=True)
             
-            # Calculate safety scores
-            borough_counts['Score'] = pd.qcut(borough_counts['Crimes12M'], 
-                                            q=5, 
-                                            labels=range(1, 6),
-                                            duplicates='drop').astype(int) * 2  # Scale to 1-10
+            # Use column names matching the London format
+            borough_counts = pd.DataFrame({
+                'Borough': df['boro_nm'].cat.categories[codes].astype(str),
+                'Crimes12M': counts.astype(np.int32)
+            })
             
-            # Rename columns to match London format
-            borough_counts.rename(columns={'boro_nm': 'Borough'}, inplace=True)
+            # Calculate safety scores
+            borough_counts['Score'] = self._quantile_scores(borough_counts['Crimes12M'], 5) * 2  # Scale to 1-10
             
             # Save processed data
-            processed_file = os.path.join(self.processed_dir, "nyc", "nyc_crime_processed.csv")
-            borough_counts.to_csv(processed_file, index=False)
+            processed_file = processed_data_file(self.processed_dir, "nyc")
+            write_processed_data(borough_counts, processed_file)
             
             logger.info(f"Processed {len(borough_counts)} NYC boroughs")
             return borough_counts
@@ -162,6 +231,23 @@ class CrimeDataProcessor:
             logger.error(f"Error processing NYC crime data: {e}")
             raise
 
+    def _quantile_scores(self, values: pd.Series, q: int) -> np.ndarray:
+        """
+        Assign each value its quantile bin (1..q), like pd.qcut but without
+        building a Categorical
+        
+        Args:
+            values: Numeric values to bin
+            q: Number of quantile bins
+            
+        Returns:
+            Array of bin numbers between 1 and q
+        """
+        vals = values.to_numpy()
+        edges = np.unique(np.quantile(vals, np.linspace(0, 1, q + 1)))
+        bins = np.digitize(vals, edges[1:-1], right=True) + 1
+        return np.clip(bins, 1, q).astype(np.int8)
+
     def analyze_crime_patterns(self, df: pd.DataFrame, city: str) -> Dict:
         """
         Analyze crime patterns and generate insights
@@ -180,15 +266,16 @@ class CrimeDataProcessor:
             'total_boroughs': len(df),
             'safest_borough': df.loc[df['Score'].idxmin(), 'Borough'],
             'highest_risk_borough': df.loc[df['Score'].idxmax(), 'Borough'],
-            'average_score': df['Score'].mean(),
-            'total_crimes': df['Crimes12M'].sum(),
-            'score_distribution': df['Score'].value_counts().to_dict()
+            'average_score': float(df['Score'].mean()),
+            'total_crimes': int(df['Crimes12M'].sum()),
+            'score_distribution': {int(score): int(count)
+                                   for score, count in df['Score'].value_counts().items()}
         }
         
         # Save analysis
         analysis_file = os.path.join(self.processed_dir, city, f"{city}_analysis.json")
-        with open(analysis_file, 'w') as f:
-            json.dump(analysis, f, indent=2)
+        with open(analysis_file, 'wb', buffering=JSON_WRITE_BUFFER) as f:
+            f.write(json_dumps(analysis))
         
         return analysis
 
@@ -205,19 +292,36 @@ class CrimeDataProcessor:
         
         # Check for processed data files
         for city in ['london', 'nyc']:
-            processed_file = os.path.join(self.processed_dir, city, f"{city}_crime_processed.csv")
-            analysis_file = os.path.join(self.processed_dir, city, f"{city}_analysis.json")
+            city_dir = os.path.join(self.processed_dir, city)
+            processed_file = processed_data_file(self.processed_dir, city)
+            analysis_file = os.path.join(city_dir, f"{city}_analysis.json")
+            
+            # List the city directory once instead of stat-ing each file
+            try:
+                with os.scandir(city_dir) as entries:
+                    names = {entry.name for entry in entries}
+            except FileNotFoundError:
+                names = set()
             
-            if os.path.exists(processed_file):
-                df = pd.read_csv(processed_file)
+            if os.path.basename(processed_file) in names:
+                # Aggregate only the two summarized columns, in chunks for CSV files
+                boroughs, total_crimes, score_sum = 0, 0, 0
+                for chunk in iter_processed_data(processed_file,
+                                                 columns=['Crimes12M', 'Score'],
+                                                 chunksize=CSV_CHUNK_SIZE):
+                    boroughs += len(chunk)
+                    total_crimes += int(chunk['Crimes12M'].sum())
+                    score_sum += int(chunk['Score'].sum())
+                average_score = score_sum / boroughs if boroughs else 0.0
+                
                 report.append(f"\n{city.upper()} Data:")
-                report.append(f"  - Boroughs processed: {len(df)}")
-                report.append(f"  - Total crimes: {df['Crimes12M'].sum():,}")
-                report.append(f"  - Average safety score: {df['Score'].mean():.1f}/10")
+                report.append(f"  - Boroughs processed: {boroughs}")
+                report.append(f"  - Total crimes: {total_crimes:,}")
+                report.append(f"  - Average safety score: {average_score:.1f}/10")
                 
-                if os.path.exists(analysis_file):
-                    with open(analysis_file, 'r') as f:
-                        analysis = json.load(f)
+                if os.path.basename(analysis_file) in names:
+                    with open(analysis_file, 'rb') as f:
+                        analysis = json_loads(f.read())
                     report.append(f"  - Safest area: {analysis['safest_borough']}")
                     report.append(f"  - Highest risk area: {analysis['highest_risk_borough']}")
         
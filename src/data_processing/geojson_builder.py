@@ -4,18 +4,42 @@ GeoJSON Builder for SafeWorld
 Handles creation of GeoJSON files for map visualization
 """
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import requests
-import json
 import os
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional
 import logging
 
+# Works both as part of the data_processing package and when run as a script
+try:
+    from .http_utils import SESSION
+    from .io_utils import JSON_WRITE_BUFFER, json_loads, orjson, processed_data_file, read_processed_data
+except ImportError:
+    from http_utils import SESSION
+    from io_utils import JSON_WRITE_BUFFER, json_loads, orjson, processed_data_file, read_processed_data
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Crime levels and the highest safety score belonging to each of the lower levels
+CRIME_LEVELS = np.array(["Low", "Moderate", "High", "Very High"])
+CRIME_LEVEL_UPPER_SCORES = [3, 6, 8]
+
+# Reuse downloaded NYC boundaries for this many seconds before refetching
+BOUNDARIES_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+
+@lru_cache(maxsize=16)
+def _get_crime_level(score: int) -> str:
+    """Convert a single safety score (1-10) to its crime level, cached per score"""
+    return str(CRIME_LEVELS[np.searchsorted(CRIME_LEVEL_UPPER_SCORES, score)])
+
 
 class GeoJSONBuilder:
     """Class for building GeoJSON files from crime data and geographic boundaries"""
@@ -32,14 +56,14 @@ class GeoJSONBuilder:
         self.processed_dir = os.path.join(data_dir, "processed")
 
     def build_london_geojson(self, 
-                           crime_csv: str, 
+                           crime_file: str, 
                            boundaries_file: str, 
                            output_file: str) -> bool:
         """
         Build London GeoJSON with crime data merged into borough boundaries
         
         Args:
-            crime_csv: Path to CSV file with crime data
+            crime_file: Path to Parquet or CSV file with processed crime data
             boundaries_file: Path to GeoJSON file with London borough boundaries
             output_file: Path for output GeoJSON file
             
@@ -50,31 +74,24 @@ class GeoJSONBuilder:
         
         try:
             # Read crime data
-            crime_data = pd.read_csv(crime_csv)
+            crime_data = read_processed_data(crime_file)
             logger.info(f"Loaded {len(crime_data)} crime records")
             
-            # Read geographic boundaries
-            geo_data = gpd.read_file(boundaries_file)
+            # Read geographic boundaries, keeping only the borough name attribute
+            geo_data = gpd.read_file(boundaries_file, columns=['LAD22NM'])
             logger.info(f"Loaded {len(geo_data)} geographic boundaries")
             
             # Normalize borough names for matching
-            geo_data['Borough'] = geo_data['LAD22NM'].str.upper().str.strip()
-            crime_data['Borough'] = crime_data['Borough'].str.upper().str.strip()
-            
-            # Filter to only London boroughs that exist in our crime data
-            london_geo = geo_data[geo_data['Borough'].isin(crime_data['Borough'])]
-            logger.info(f"Filtered to {len(london_geo)} London boroughs")
+            geo_data['Borough'] = self._normalize_boroughs(geo_data['LAD22NM'])
+            crime_data['Borough'] = self._normalize_boroughs(crime_data['Borough'])
             
-            # Merge crime data with geographic boundaries
-            merged = london_geo.merge(crime_data, on='Borough', how='left')
-            
-            # Fill any missing crime data with 0
-            merged['Crimes12M'] = merged['Crimes12M'].fillna(0)
-            merged['Score'] = merged['Score'].fillna(1)  # Default to safest score
+            # Join crime data onto the London boroughs that exist in our crime data
+            merged = self._join_crime_data(geo_data, crime_data, matched_only=True)
+            logger.info(f"Filtered to {len(merged)} London boroughs")
             
             # Add additional properties for the map
-            merged['CrimeLevel'] = merged['Score'].apply(self._get_crime_level)
-            merged['Description'] = merged.apply(self._create_borough_description, axis=1)
+            merged['CrimeLevel'] = self._get_crime_levels(merged['Score'])
+            merged['Description'] = self._create_borough_descriptions(merged)
             
             # Select columns for final GeoJSON
             columns_to_keep = [
@@ -83,7 +100,7 @@ class GeoJSONBuilder:
             final_data = merged[columns_to_keep]
             
             # Save as GeoJSON
-            final_data.to_file(output_file, driver='GeoJSON')
+            self._write_geojson(final_data, output_file)
             logger.info(f"London GeoJSON saved to {output_file}")
             
             return True
@@ -96,37 +113,53 @@ class GeoJSONBuilder:
         """
         Fetch NYC borough boundaries from NYC Open Data API
         
+        A previously downloaded copy younger than BOUNDARIES_CACHE_MAX_AGE
+        is reused instead of hitting the network.
+        
         Returns:
             GeoJSON data or None if failed
         """
+        boundaries_file = os.path.join(self.raw_dir, "nyc", "nyc_boundaries.geojson")
+        
+        # Use the cached boundaries if they are recent enough
+        if (os.path.exists(boundaries_file) and
+                time.time() - os.path.getmtime(boundaries_file) < BOUNDARIES_CACHE_MAX_AGE):
+            try:
+                with open(boundaries_file, 'rb') as f:
+                    geojson_data = json_loads(f.read())
+                logger.info(f"Loaded {len(geojson_data.get('features', []))} cached NYC boundaries")
+                return geojson_data
+            except ValueError as e:
+                logger.warning(f"Ignoring unreadable cached NYC boundaries: {e}")
+        
         logger.info("Fetching NYC borough boundaries...")
         
         url = "https://data.cityofnewyork.us/resource/tqmj-j8zm.geojson"
         
         try:
-            response = requests.get(url, timeout=30)
+            response = SESSION.get(url, timeout=30)
             response.raise_for_status()
             
-            geojson_data = response.json()
-            logger.info(f"Fetched {len(geojson_data.get('features', []))} NYC boundaries")
+            # Parse before saving so an invalid payload never becomes the cached copy
+            geojson_data = json_loads(response.content)
             
             # Save raw boundaries
-            boundaries_file = os.path.join(self.raw_dir, "nyc", "nyc_boundaries.geojson")
-            with open(boundaries_file, 'w') as f:
-                json.dump(geojson_data, f, indent=2)
+            with open(boundaries_file, 'wb', buffering=JSON_WRITE_BUFFER) as f:
+                f.write(response.content)
+            logger.info(f"Fetched {len(geojson_data.get('features', []))} NYC boundaries")
             
             return geojson_data
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             logger.error(f"Error fetching NYC boundaries: {e}")
             return self._create_fallback_nyc_boundaries()
 
-    def build_nyc_geojson(self, crime_csv: str, output_file: str) -> bool:
+    def build_nyc_geojson(self, crime_file: str, output_file: str) -> bool:
         """
         Build NYC GeoJSON with crime data
         
         Args:
-            crime_csv: Path to CSV file with NYC crime data
+            crime_file: Path to Parquet or CSV file with processed NYC crime data
             output_file: Path for output GeoJSON file
             
         Returns:
@@ -136,30 +169,34 @@ class GeoJSONBuilder:
         
         try:
             # Read crime data
-            crime_data = pd.read_csv(crime_csv)
+            crime_data = read_processed_data(crime_file)
             
             # Fetch boundaries
             boundaries = self.fetch_nyc_boundaries()
             if not boundaries:
                 return False
             
-            # Convert boundaries to GeoDataFrame
-            geo_df = gpd.GeoDataFrame.from_features(boundaries['features'])
+            # Convert boundaries to GeoDataFrame, dropping unused properties
+            features = [
+                {
+                    'type': 'Feature',
+                    'geometry': feature['geometry'],
+                    'properties': {'boro_name': feature['properties']['boro_name']}
+                }
+                for feature in boundaries['features']
+            ]
+            geo_df = gpd.GeoDataFrame.from_features(features)
             
             # Normalize borough names
-            geo_df['Borough'] = geo_df['boro_name'].str.upper().str.strip()
-            crime_data['Borough'] = crime_data['Borough'].str.upper().str.strip()
+            geo_df['Borough'] = self._normalize_boroughs(geo_df['boro_name'])
+            crime_data['Borough'] = self._normalize_boroughs(crime_data['Borough'])
             
-            # Merge crime data
-            merged = geo_df.merge(crime_data, on='Borough', how='left')
-            
-            # Fill missing data
-            merged['Crimes12M'] = merged['Crimes12M'].fillna(0)
-            merged['Score'] = merged['Score'].fillna(1)
+            # Join crime data
+            merged = self._join_crime_data(geo_df, crime_data)
             
             # Add map properties
-            merged['CrimeLevel'] = merged['Score'].apply(self._get_crime_level)
-            merged['Description'] = merged.apply(self._create_borough_description, axis=1)
+            merged['CrimeLevel'] = self._get_crime_levels(merged['Score'])
+            merged['Description'] = self._create_borough_descriptions(merged)
             
             # Select columns for output
             columns_to_keep = [
@@ -168,7 +205,7 @@ class GeoJSONBuilder:
             final_data = merged[columns_to_keep]
             
             # Save as GeoJSON
-            final_data.to_file(output_file, driver='GeoJSON')
+            self._write_geojson(final_data, output_file)
             logger.info(f"NYC GeoJSON saved to {output_file}")
             
             return True
@@ -177,6 +214,48 @@ class GeoJSONBuilder:
             logger.error(f"Error building NYC GeoJSON: {e}")
             return False
 
+    def _normalize_boroughs(self, names: pd.Series) -> np.ndarray:
+        """
+        Normalize borough names for matching (stripped and upper case),
+        touching each string only once
+        
+        Args:
+            names: Borough names
+            
+        Returns:
+            Array of normalized names
+        """
+        arr = names.to_numpy()
+        return np.fromiter((name.strip().upper() if isinstance(name, str) else name for name in arr),
+                           dtype=object, count=len(arr))
+
+    def _join_crime_data(self,
+                         geo_df: gpd.GeoDataFrame,
+                         crime_data: pd.DataFrame,
+                         matched_only: bool = False) -> gpd.GeoDataFrame:
+        """
+        Attach Crimes12M and Score to boundaries with a single indexed join
+        
+        Boroughs without crime data get 0 crimes and the safest score.
+        
+        Args:
+            geo_df: Boundaries with a normalized Borough column
+            crime_data: Crime data with a normalized Borough column
+            matched_only: Drop boundaries that have no crime data
+            
+        Returns:
+            GeoDataFrame with int32 Crimes12M and int8 Score columns
+        """
+        crime = crime_data.drop_duplicates('Borough').set_index('Borough')[['Crimes12M', 'Score']]
+        aligned = crime.reindex(geo_df['Borough'].to_numpy())
+        
+        if matched_only:
+            matched = crime.index.get_indexer(aligned.index) >= 0
+            geo_df, aligned = geo_df[matched], aligned[matched]
+        
+        aligned = aligned.fillna({'Crimes12M': 0, 'Score': 1}).astype({'Crimes12M': np.int32, 'Score': np.int8})
+        return geo_df.assign(**{col: aligned[col].to_numpy() for col in aligned.columns})
+
     def _get_crime_level(self, score: int) -> str:
         """
         Convert numeric score to descriptive crime level
@@ -187,31 +266,67 @@ class GeoJSONBuilder:
         Returns:
             Descriptive crime level
         """
-        if score <= 3:
-            return "Low"
-        elif score <= 6:
-            return "Moderate"
-        elif score <= 8:
-            return "High"
-        else:
-            return "Very High"
+        return _get_crime_level(score)
 
-    def _create_borough_description(self, row) -> str:
+    def _get_crime_levels(self, scores: pd.Series) -> np.ndarray:
         """
-        Create a description for the borough based on crime data
+        Convert a column of numeric scores to descriptive crime levels
         
         Args:
-            row: DataFrame row with borough data
+            scores: Safety scores (1-10)
             
         Returns:
-            Formatted description string
+            Array of descriptive crime levels
+        """
+        return CRIME_LEVELS[np.searchsorted(CRIME_LEVEL_UPPER_SCORES, scores.to_numpy())]
+
+    def _create_borough_descriptions(self, df: pd.DataFrame) -> pd.Series:
         """
-        borough = row['Borough']
-        crimes = int(row['Crimes12M']) if pd.notna(row['Crimes12M']) else 0
-        score = int(row['Score']) if pd.notna(row['Score']) else 1
-        level = row.get('CrimeLevel', 'Low')
+        Create descriptions for each borough based on crime data
         
-        return f"{borough}: {crimes:,} crimes reported (Safety Score: {score}/10 - {level})"
+        Args:
+            df: DataFrame with Borough, Crimes12M, Score and CrimeLevel columns
+            
+        Returns:
+            Series of formatted description strings
+        """
+        crimes = df['Crimes12M'].fillna(0).astype(int).map('{:,}'.format)
+        scores = df['Score'].fillna(1).astype(int).astype(str)
+        
+        return (df['Borough'] + ': ' + crimes +
+                ' crimes reported (Safety Score: ' + scores +
+                '/10 - ' + df['CrimeLevel'] + ')')
+
+    def _write_geojson(self, gdf: gpd.GeoDataFrame, output_file: str) -> None:
+        """
+        Write a GeoDataFrame as a GeoJSON FeatureCollection
+        
+        Serializes the feature collection directly with orjson when it is
+        installed, otherwise falls back to the GDAL GeoJSON driver. Both
+        paths produce the same shape: a layer name, a crs member when the
+        CRS is known, and features without id or bbox members.
+        
+        Args:
+            gdf: GeoDataFrame to write
+            output_file: Path for output GeoJSON file
+        """
+        if orjson is None:
+            gdf.to_file(output_file, driver='GeoJSON')
+            return
+        
+        # Mirror the members GDAL writes for a GeoJSON layer
+        collection = {
+            "type": "FeatureCollection",
+            "name": os.path.splitext(os.path.basename(output_file))[0]
+        }
+        epsg = gdf.crs.to_epsg() if gdf.crs is not None else None
+        if epsg is not None:
+            crs_name = "urn:ogc:def:crs:OGC:1.3:CRS84" if epsg == 4326 else f"urn:ogc:def:crs:EPSG::{epsg}"
+            collection["crs"] = {"type": "name", "properties": {"name": crs_name}}
+        collection["features"] = gdf.to_geo_dict(drop_id=True, show_bbox=False)["features"]
+        
+        with open(output_file, 'wb', buffering=JSON_WRITE_BUFFER) as f:
+            f.write(orjson.dumps(collection, option=orjson.OPT_SERIALIZE_NUMPY))
 
     def _create_fallback_nyc_boundaries(self) -> Dict:
         """
@@ -302,26 +417,35 @@ class GeoJSONBuilder:
         
         success = True
         
-        # Build London GeoJSON
-        london_crime = os.path.join(self.processed_dir, "london", "london_crime_processed.csv")
-        london_boundaries = os.path.join(self.raw_dir, "london", "LAD_Dec_2022_UK_BUC.geojson")
-        london_output = os.path.join(self.processed_dir, "london", "london_crime_map.geojson")
-        
-        if os.path.exists(london_crime) and os.path.exists(london_boundaries):
-            success &= self.build_london_geojson(london_crime, london_boundaries, london_output)
-        else:
-            logger.warning("London data files not found")
-            success = False
-        
-        # Build NYC GeoJSON
-        nyc_crime = os.path.join(self.processed_dir, "nyc", "nyc_crime_processed.csv")
-        nyc_output = os.path.join(self.processed_dir, "nyc", "nyc_crime_map.geojson")
-        
-        if os.path.exists(nyc_crime):
-            success &= self.build_nyc_geojson(nyc_crime, nyc_output)
-        else:
-            logger.warning("NYC crime data not found")
-            success = False
+        # The London and NYC builds are independent and mostly wait on IO,
+        # so run them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            builds = []
+            
+            # Build London GeoJSON
+            london_crime = processed_data_file(self.processed_dir, "london")
+            london_boundaries = os.path.join(self.raw_dir, "london", "LAD_Dec_2022_UK_BUC.geojson")
+            london_output = os.path.join(self.processed_dir, "london", "london_crime_map.geojson")
+            
+            if os.path.exists(london_crime) and os.path.exists(london_boundaries):
+                builds.append(executor.submit(self.build_london_geojson,
+                                              london_crime, london_boundaries, london_output))
+            else:
+                logger.warning("London data files not found")
+                success = False
+            
+            # Build NYC GeoJSON
+            nyc_crime = processed_data_file(self.processed_dir, "nyc")
+            nyc_output = os.path.join(self.processed_dir, "nyc", "nyc_crime_map.geojson")
+            
+            if os.path.exists(nyc_crime):
+                builds.append(executor.submit(self.build_nyc_geojson, nyc_crime, nyc_output))
+            else:
+                logger.warning("NYC crime data not found")
+                success = False
+            
+            for build in builds:
+                success &= build.result()
         
         return success
 
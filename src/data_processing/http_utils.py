@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+HTTP helpers for SafeWorld
+Shared requests session used by the crime data processor and GeoJSON builder
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP session so repeated API calls reuse pooled connections
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
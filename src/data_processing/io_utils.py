@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+File IO helpers for SafeWorld
+Shared JSON and processed-data reading/writing used by the crime data
+processor and GeoJSON builder
+"""
+
+import importlib.util
+import json
+import os
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib json module
+    orjson = None
+
+# pyarrow is optional: it speeds up CSV parsing and is one of the Parquet
+# engines, but everything falls back to pandas' own readers and CSV without it
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Reading CSVs with Arrow-backed columns needs dtype_backend, added in pandas 2.0
+PYARROW_CSV_AVAILABLE = PYARROW_AVAILABLE and int(pd.__version__.split('.')[0]) >= 2
+
+# Processed crime data is stored as Parquet when pandas has an engine for it,
+# otherwise as CSV so the pipeline still runs with pandas alone
+PARQUET_AVAILABLE = PYARROW_AVAILABLE or importlib.util.find_spec('fastparquet') is not None
+PROCESSED_EXTENSION = '.parquet' if PARQUET_AVAILABLE else '.csv'
+
+# Write buffer for JSON dumps; the 8KB default is far too small
+JSON_WRITE_BUFFER = 1 << 20
+
+
+def json_loads(data: bytes):
+    """Parse JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj) -> bytes:
+    """Serialize obj as compact JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def processed_data_file(processed_dir: str, city: str) -> str:
+    """Path of the processed crime data file for a city"""
+    return os.path.join(processed_dir, city, f"{city}_crime_processed{PROCESSED_EXTENSION}")
+
+
+def write_processed_data(df: pd.DataFrame, path: str) -> None:
+    """Write processed crime data as Parquet or CSV, depending on the path's extension"""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, compression='zstd', index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def read_processed_data(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read processed crime data written by write_processed_data"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def iter_processed_data(path: str,
+                        columns: Optional[List[str]] = None,
+                        chunksize: int = 200_000) -> Iterator[pd.DataFrame]:
+    """Yield processed crime data in chunks (CSV) or as one columnar read (Parquet)"""
+    if path.endswith('.parquet'):
+        yield pd.read_parquet(path, columns=columns)
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)